@@ -1,9 +1,15 @@
 import logging
+import os
 import uuid
 import time
-from datetime import datetime
+import orjson
+from datetime import datetime, timezone
 from typing import Optional
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import ValidationError
 from api.schemas import (
     SentimentRequest,
     SyncSentimentResponse,
@@ -13,6 +19,9 @@ from api.schemas import (
 )
 from api.services.queue_service import QueueService
 from api.services.database_service import DatabaseService
+from api.services.batching_service import PredictionBatcher
+from api.services.cache_service import CacheService
+from api.services.model_service import ModelService
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["sentiment"])
@@ -20,12 +29,11 @@ router = APIRouter(tags=["sentiment"])
 # In-memory cache for sync requests (simple implementation)
 sync_model = None
 
-def load_sync_model():
-    """Lazy load model for sync requests"""
+def load_sync_model() -> ModelService:
+    """Load the model for sync requests (called at startup, lazily as a fallback)"""
     global sync_model
     if sync_model is None:
         try:
-            from api.services.model_service import ModelService
             sync_model = ModelService()
             logger.info("Sync model loaded successfully")
         except Exception as e:
@@ -33,37 +41,136 @@ def load_sync_model():
             raise
     return sync_model
 
+# Shared service instances, reused across requests
+shared_queue_service = None
+shared_db_service = None
+shared_batcher = None
+shared_cache_service = None
+
+def get_prediction_batcher() -> PredictionBatcher:
+    """Return the shared PredictionBatcher wrapping the sync model"""
+    global shared_batcher
+    if shared_batcher is None:
+        shared_batcher = PredictionBatcher(
+            load_sync_model(),
+            max_batch_size=int(os.getenv("SYNC_BATCH_SIZE", 32)),
+            max_wait=float(os.getenv("SYNC_BATCH_WAIT_MS", 5)) / 1000
+        )
+    return shared_batcher
+
+def get_queue_service() -> QueueService:
+    """Return the shared QueueService, creating it on first use"""
+    global shared_queue_service
+    if shared_queue_service is None:
+        shared_queue_service = QueueService()
+    return shared_queue_service
+
+def get_database_service() -> DatabaseService:
+    """Return the shared DatabaseService, connecting on first use"""
+    global shared_db_service
+    if shared_db_service is None:
+        shared_db_service = DatabaseService()
+    return shared_db_service
+
+def get_cache_service() -> CacheService:
+    """Return the shared CacheService"""
+    global shared_cache_service
+    if shared_cache_service is None:
+        shared_cache_service = CacheService()
+    return shared_cache_service
+
+def shutdown_services():
+    """Close shared service connections"""
+    global shared_queue_service, shared_db_service, shared_batcher, shared_cache_service
+    if shared_batcher is not None:
+        shared_batcher.stop()
+        shared_batcher = None
+    if shared_queue_service is not None:
+        shared_queue_service.close()
+        shared_queue_service = None
+    if shared_db_service is not None:
+        shared_db_service.close()
+        shared_db_service = None
+    if shared_cache_service is not None:
+        shared_cache_service.close()
+        shared_cache_service = None
+
+def as_datetime(value) -> datetime:
+    """Return a stored date as a datetime
+    
+    Results are written with native BSON dates; ISO strings are only parsed
+    for documents written before that change.
+    """
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace("Z", ""))
+
+def json_response(model, status_code: int = status.HTTP_200_OK) -> Response:
+    """Serialize a server-built response model once
+    
+    Returning a Response makes FastAPI skip re-validating it against the
+    route's response_model, which is still used for the OpenAPI schema.
+    """
+    return ORJSONResponse(content=model.model_dump(), status_code=status_code)
+
+# The body is parsed by parse_sentiment_request, so document it explicitly
+SENTIMENT_REQUEST_BODY = {
+    "requestBody": {
+        "content": {"application/json": {"schema": SentimentRequest.model_json_schema()}},
+        "required": True
+    }
+}
+
+async def parse_sentiment_request(raw: Request) -> SentimentRequest:
+    """Parse and validate the JSON body in a single pass (pydantic-core/jiter)
+    
+    Raises RequestValidationError so errors keep FastAPI's 422 format.
+    """
+    try:
+        return SentimentRequest.model_validate_json(await raw.body())
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
+
 @router.post(
     "/sentiment/sync",
     response_model=SyncSentimentResponse,
     responses={
         400: {"model": ErrorResponse},
         500: {"model": ErrorResponse}
-    }
+    },
+    openapi_extra=SENTIMENT_REQUEST_BODY
 )
-async def analyze_sentiment_sync(request: SentimentRequest):
+async def analyze_sentiment_sync(request: SentimentRequest = Depends(parse_sentiment_request)):
     """Synchronous sentiment analysis endpoint
     
     Process sentiment analysis immediately and return result.
     Useful for real-time analysis with small text.
     """
-    logger.info(f"Sync sentiment analysis request: {len(request.text)} chars")
+    logger.debug("Sync sentiment analysis request: %d chars", len(request.text))
     
     try:
-        model_service = load_sync_model()
+        batcher = get_prediction_batcher()
         
         start_time = time.time()
-        sentiment, score = model_service.predict(request.text)
+        sentiment, score = await batcher.predict(request.text)
         processing_time = time.time() - start_time
         
-        logger.info(f"Sync analysis completed: {sentiment} ({score:.4f}) in {processing_time:.3f}s")
+        logger.debug("Sync analysis completed: %s (%.4f) in %.3fs", sentiment, score, processing_time)
+        
+        # Only long texts need a new string for the preview
+        text = request.text
+        text_preview = text if len(text) <= 100 else text[:100] + "..."
         
-        return SyncSentimentResponse(
-            text=request.text[:100] + ("..." if len(request.text) > 100 else ""),
+        # Values are produced by the server, so skip re-validation
+        return json_response(SyncSentimentResponse.model_construct(
+            text=text_preview,
             sentiment=sentiment,
             score=score,
             processing_time=processing_time
-        )
+        ))
     except ValueError as e:
         logger.warning(f"Validation error in sync analysis: {str(e)}")
         raise HTTPException(
@@ -84,41 +191,43 @@ async def analyze_sentiment_sync(request: SentimentRequest):
     responses={
         400: {"model": ErrorResponse},
         500: {"model": ErrorResponse}
-    }
+    },
+    openapi_extra=SENTIMENT_REQUEST_BODY
 )
-async def analyze_sentiment_async(request: SentimentRequest):
+async def analyze_sentiment_async(request: SentimentRequest = Depends(parse_sentiment_request)):
     """Asynchronous sentiment analysis endpoint
     
     Submit text for background processing. Returns job ID to retrieve results later.
     Ideal for batch processing or long texts.
     """
-    logger.info(f"Async sentiment analysis request: {len(request.text)} chars")
+    logger.debug("Async sentiment analysis request: %d chars", len(request.text))
     
     try:
         # Generate unique job ID
-        job_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
+        job_id = uuid.uuid4().hex
+        # One clock read for both the message and the response
+        submitted_at = datetime.now(timezone.utc)
         
         # Create message payload
         message = {
             "job_id": job_id,
             "text": request.text,
-            "timestamp": timestamp,
+            "timestamp": submitted_at.isoformat(),
             "status": "submitted"
         }
         
-        # Send to queue
-        queue_service = QueueService()
-        queue_service.publish_message(message)
+        # Send to queue; pika blocks, so keep it off the event loop
+        queue_service = get_queue_service()
+        await run_in_threadpool(queue_service.publish_message, message)
         
-        logger.info(f"Job submitted to queue: {job_id}")
+        logger.debug("Job submitted to queue: %s", job_id)
         
-        return AsyncSentimentResponse(
+        return json_response(AsyncSentimentResponse.model_construct(
             job_id=job_id,
             status="processing",
             message="Sentiment analysis job submitted successfully. Use job_id to retrieve results.",
-            timestamp=datetime.now()
-        )
+            timestamp=submitted_at
+        ), status_code=status.HTTP_202_ACCEPTED)
     except Exception as e:
         logger.error(f"Error submitting async job: {str(e)}")
         raise HTTPException(
@@ -140,28 +249,47 @@ async def get_sentiment_result(job_id: str):
     Retrieve the result of an async sentiment analysis job.
     Returns 404 if job not found or still processing.
     """
-    logger.info(f"Result request for job: {job_id}")
+    logger.debug("Result request for job: %s", job_id)
     
     try:
-        db_service = DatabaseService()
-        result = db_service.get_result(job_id)
+        # Clients poll the same job repeatedly; serve completed jobs from Redis.
+        # redis-py and pymongo block, so keep them off the event loop
+        cache_service = get_cache_service()
+        cached = await run_in_threadpool(cache_service.get_result, job_id)
+        if cached is not None:
+            logger.debug("Result served from cache for job: %s", job_id)
+            return Response(content=cached, media_type="application/json")
+        
+        db_service = get_database_service()
+        result = await run_in_threadpool(db_service.get_result, job_id)
         
         if not result:
-            logger.warning(f"Job not found: {job_id}")
+            logger.debug("Job not found: %s", job_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Job ID '{job_id}' not found or still processing"
             )
         
-        # Calculate processing time
-        timestamp = datetime.fromisoformat(result["timestamp"].replace("Z", ""))
-        processed_at = datetime.fromisoformat(result["processed_at"].replace("Z", ""))
+        # Calculate processing time (dates are stored as native BSON datetimes)
+        timestamp = as_datetime(result["timestamp"])
+        processed_at = as_datetime(result["processed_at"])
         processing_time = (processed_at - timestamp).total_seconds()
         
-        result["processing_time"] = processing_time
+        response = SentimentResult.model_construct(
+            job_id=result["job_id"],
+            text=result["text"],
+            sentiment=result["sentiment"],
+            score=result["score"],
+            timestamp=timestamp,
+            processed_at=processed_at,
+            processing_time=processing_time
+        )
+        # Encode once and reuse the bytes for both the cache and the response
+        body = orjson.dumps(response.model_dump())
+        await run_in_threadpool(cache_service.set_result, job_id, body)
         
-        logger.info(f"Result retrieved for job: {job_id}")
-        return SentimentResult(**result)
+        logger.debug("Result retrieved for job: %s", job_id)
+        return Response(content=body, media_type="application/json")
         
     except HTTPException:
         raise
@@ -1,12 +1,23 @@
 import logging
+import os
 from datetime import datetime
+import anyio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.endpoints import router
+from fastapi.responses import ORJSONResponse
+from api.endpoints import (
+    router,
+    get_queue_service,
+    get_database_service,
+    get_prediction_batcher,
+    load_sync_model,
+    shutdown_services
+)
 
 # Configure logging
+# LOG_LEVEL=WARNING in production keeps per-request logs off stderr
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -17,7 +28,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -29,13 +41,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_event():
+    """Load and warm the model, start the batcher and open shared connections"""
+    # Bound the threadpool used for model batches and broker publishes so
+    # bursts queue up instead of oversubscribing the CPU
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = int(os.getenv("THREADPOOL_SIZE", min(8, (os.cpu_count() or 1) * 2)))
+    
+    # Pay model construction and first-call costs here, not on the first request
+    load_sync_model().predict_batch(["warmup"])
+    get_prediction_batcher().start()
+    try:
+        get_queue_service().connect()
+    except Exception as e:
+        logger.error(f"RabbitMQ unavailable at startup, will retry on first publish: {str(e)}")
+    try:
+        get_database_service()
+    except Exception as e:
+        logger.error(f"MongoDB unavailable at startup, will retry on first request: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close shared connections"""
+    shutdown_services()
+
 # Include routers
 app.include_router(router, prefix="/api")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    logger.info("Health check requested")
+    logger.debug("Health check requested")
     return {
         "status": "healthy",
         "service": "sentiment-analysis-api",
@@ -59,4 +96,14 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Workers need the app as an import string; uvloop/httptools ship with uvicorn[standard]
+    uvicorn.run(
+        "api.main:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", 8000)),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        log_level=os.getenv("LOG_LEVEL", "INFO").lower(),
+        access_log=False
+    )
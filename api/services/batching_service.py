@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from typing import List, Tuple
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+class PredictionBatcher:
+    """Micro-batches concurrent sync predictions into single model calls
+
+    Requests are queued with a future; a background task collects up to
+    max_batch_size texts (waiting at most max_wait seconds after the first
+    one), runs ModelService.predict_batch in the threadpool and resolves
+    each future with its own result.
+    """
+
+    def __init__(self, model_service, max_batch_size: int = 32, max_wait: float = 0.005):
+        self.model_service = model_service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = None
+        self._task = None
+        self._loop = None
+
+    def start(self):
+        """Start the batching loop on the running event loop (app startup)
+        
+        The queue and futures belong to that loop, so a batcher started on
+        one loop refuses to be restarted on another while it is running.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done():
+            if self._loop is loop:
+                return
+            raise RuntimeError("PredictionBatcher is already running on another event loop")
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+        logger.info(f"Prediction batcher started (max_batch_size={self.max_batch_size}, max_wait={self.max_wait}s)")
+
+    def stop(self):
+        """Cancel the batching loop"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self._loop = None
+
+    async def predict(self, text: str) -> Tuple[str, float]:
+        """Queue text for the next batch and wait for its prediction"""
+        if self._task is None or self._task.done():
+            raise RuntimeError("PredictionBatcher is not running; call start() at app startup")
+        if asyncio.get_running_loop() is not self._loop:
+            raise RuntimeError("PredictionBatcher.predict called from a different event loop than start()")
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._process(batch)
+
+    async def _process(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            results = await run_in_threadpool(self.model_service.predict_batch, texts)
+        except Exception as e:
+            logger.error(f"Batch prediction failed for {len(texts)} texts: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # Skip requests whose clients went away while waiting
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,44 @@
+import logging
+import os
+from typing import Optional
+import redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+class CacheService:
+    """Redis cache for completed results, keyed by job ID
+
+    The cache is best-effort: Redis errors are logged and treated as a miss
+    so result lookups fall back to MongoDB.
+    """
+
+    def __init__(self):
+        self.redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
+        self.ttl = int(os.getenv("RESULT_CACHE_TTL", 3600))
+        self.key_prefix = "res:"
+        # from_url keeps a connection pool; connections are opened lazily
+        self.client = redis.Redis.from_url(
+            self.redis_url,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+
+    def get_result(self, job_id: str) -> Optional[bytes]:
+        """Get the cached JSON response body for a job, or None on miss"""
+        try:
+            return self.client.get(f"{self.key_prefix}{job_id}")
+        except RedisError as e:
+            logger.warning(f"Redis cache read failed for job {job_id}: {str(e)}")
+            return None
+
+    def set_result(self, job_id: str, payload: bytes):
+        """Cache the JSON response body for a completed job"""
+        try:
+            self.client.set(f"{self.key_prefix}{job_id}", payload, ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"Redis cache write failed for job {job_id}: {str(e)}")
+
+    def close(self):
+        """Release pooled Redis connections"""
+        self.client.close()
@@ -6,6 +6,16 @@ from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionT
 
 logger = logging.getLogger(__name__)
 
+RESULT_PROJECTION = {
+    "_id": 0,
+    "job_id": 1,
+    "text": 1,
+    "sentiment": 1,
+    "score": 1,
+    "timestamp": 1,
+    "processed_at": 1
+}
+
 class DatabaseService:
     def __init__(self):
         self.mongodb_url = os.getenv("MONGODB_URL", "mongodb://mongodb:27017/sentiment_db")
@@ -21,7 +31,10 @@ class DatabaseService:
                 self.mongodb_url,
                 serverSelectionTimeoutMS=5000,
                 maxPoolSize=50,
-                retryWrites=True
+                retryWrites=True,
+                # Result documents carry up to 1000 chars of text
+                compressors=os.getenv("MONGODB_COMPRESSORS", "zstd,zlib"),
+                zlibCompressionLevel=3
             )
             # Test connection
             self.client.admin.command('ping')
@@ -45,16 +58,8 @@ class DatabaseService:
     def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Get sentiment analysis result by job ID"""
         try:
-            result = self.collection.find_one({"job_id": job_id})
-            if result:
-                # Convert ObjectId to string
-                result['_id'] = str(result['_id'])
-                # Ensure proper datetime format
-                for date_field in ['timestamp', 'processed_at']:
-                    if date_field in result and not isinstance(result[date_field], str):
-                        result[date_field] = result[date_field].isoformat()
-                return result
-            return None
+            # Fetch only the fields the API returns (no _id/worker metadata)
+            return self.collection.find_one({"job_id": job_id}, projection=RESULT_PROJECTION)
         except OperationFailure as e:
             logger.error(f"MongoDB operation failed: {str(e)}")
             raise Exception(f"Database operation failed: {str(e)}")
@@ -70,3 +75,8 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"MongoDB connection check failed: {str(e)}")
             return False
+    
+    def close(self):
+        """Close the MongoDB client and its connection pool"""
+        if self.client:
+            self.client.close()
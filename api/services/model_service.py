@@ -1,47 +1,72 @@
 import os
 import logging
+import random
+import re
 import numpy as np
-from typing import Tuple
+from typing import List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Keyword lookups are built once at import time
+_POSITIVE_KEYWORDS = frozenset(['love', 'great', 'excellent', 'good', 'amazing', 'awesome', 'best'])
+_NEGATIVE_KEYWORDS = frozenset(['hate', 'terrible', 'bad', 'awful', 'worst', 'poor'])
+# One alternation over the whole dictionary: the regex engine scans the text
+# once in C and only keyword hits come back to Python
+_KEYWORD_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(_POSITIVE_KEYWORDS | _NEGATIVE_KEYWORDS)) + r")\b",
+    re.IGNORECASE
+)
+
 class ModelService:
     def __init__(self):
         """Initialize a mock model service for development"""
         logger.info("Initializing ModelService (mock implementation)")
         self.model_loaded = True
     
+    def _keyword_score(self, text: str) -> float:
+        """Share of positive keywords among all keyword hits (0.5 if none)"""
+        matches = [match.lower() for match in _KEYWORD_RE.findall(text)]
+        
+        positive_count = sum(1 for word in matches if word in _POSITIVE_KEYWORDS)
+        negative_count = len(matches) - positive_count
+        
+        total = positive_count + negative_count
+        if total > 0:
+            return positive_count / total
+        # Neutral if no keywords found
+        return 0.5
+    
     def predict(self, text: str) -> Tuple[str, float]:
         """Mock sentiment prediction for development
         
         In production, this would load a real TensorFlow/Keras model.
         """
         # Simple mock sentiment analysis based on keywords
-        positive_keywords = ['love', 'great', 'excellent', 'good', 'amazing', 'awesome', 'best']
-        negative_keywords = ['hate', 'terrible', 'bad', 'awful', 'worst', 'poor']
-        
-        text_lower = text.lower()
-        
-        positive_count = sum(1 for word in positive_keywords if word in text_lower)
-        negative_count = sum(1 for word in negative_keywords if word in text_lower)
-        
-        total = positive_count + negative_count
-        if total > 0:
-            score = positive_count / total
-        else:
-            # Neutral if no keywords found
-            score = 0.5
+        score = self._keyword_score(text)
         
         # Add some randomness to make it interesting
-        import random
         score = max(0.0, min(1.0, score + random.uniform(-0.2, 0.2)))
         
         sentiment = "positive" if score >= 0.5 else "negative"
         
-        logger.debug(f"Mock prediction: {sentiment} ({score:.4f}) for text: {text[:50]}...")
+        logger.debug("Mock prediction: %s (%.4f) for text: %.50s...", sentiment, score, text)
         
         return sentiment, float(score)
     
+    def predict_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Mock sentiment prediction for a batch of texts
+        
+        Noise and clipping are applied to the whole batch at once, mirroring
+        how a real model would score a padded batch in one call.
+        """
+        base_scores = np.array([self._keyword_score(text) for text in texts], dtype=np.float64)
+        scores = np.clip(base_scores + np.random.uniform(-0.2, 0.2, size=len(texts)), 0.0, 1.0)
+        
+        return [
+            ("positive" if score >= 0.5 else "negative", float(score))
+            for score in scores
+        ]
+    
     def is_loaded(self):
         """Check if model is loaded"""
         return self.model_loaded
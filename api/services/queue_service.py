@@ -1,9 +1,10 @@
 import pika
-import json
+import orjson
 import logging
 import os
+import threading
 from typing import Dict, Any
-from pika.exceptions import AMQPConnectionError, AMQPError
+from pika.exceptions import AMQPChannelError, AMQPConnectionError, AMQPError
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +17,11 @@ class QueueService:
         self.queue_name = "sentiment_analysis_queue"
         self.exchange_name = "sentiment_exchange"
         self.routing_key = "sentiment.job"
-        
+        self.connection = None
+        self.channel = None
+        # BlockingConnection is not thread-safe; publishes run in the threadpool
+        self._lock = threading.RLock()
+
     def _create_connection(self):
         """Create RabbitMQ connection with retry logic"""
         max_retries = 3
@@ -46,64 +51,107 @@ class QueueService:
                 import time
                 time.sleep(retry_delay)
     
+    def connect(self):
+        """Open the long-lived connection and channel used for publishing"""
+        with self._lock:
+            if self.connection is None or self.connection.is_closed:
+                self.connection = self._create_connection()
+                self.channel = None
+            if self.channel is None or self.channel.is_closed:
+                channel = self.connection.channel()
+                self._declare_topology(channel)
+                self.channel = channel
+            return self.channel
+    
     def publish_message(self, message: Dict[str, Any]):
-        """Publish message to RabbitMQ queue with durability"""
-        connection = None
-        try:
-            connection = self._create_connection()
-            channel = connection.channel()
-            
-            # Declare exchange
-            channel.exchange_declare(
-                exchange=self.exchange_name,
-                exchange_type='direct',
-                durable=True
-            )
-            
-            # Declare queue with durability and DLQ support
-            channel.queue_declare(
-                queue=self.queue_name,
-                durable=True,
-                arguments={
-                    'x-dead-letter-exchange': '',
-                    'x-dead-letter-routing-key': f"{self.queue_name}_dlq",
-                    'x-max-priority': 10
-                }
-            )
-            
-            # Bind queue to exchange
-            channel.queue_bind(
-                exchange=self.exchange_name,
-                queue=self.queue_name,
-                routing_key=self.routing_key
-            )
-            
-            # Declare DLQ
-            channel.queue_declare(
-                queue=f"{self.queue_name}_dlq",
-                durable=True
-            )
-            
-            # Publish message with persistent delivery
-            channel.basic_publish(
-                exchange=self.exchange_name,
-                routing_key=self.routing_key,
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # Make message persistent
-                    content_type='application/json',
-                    priority=5
-                )
+        """Publish message to RabbitMQ queue with durability
+        
+        Reuses the shared connection; if the broker dropped it while idle,
+        reconnects once and retries the publish.
+        """
+        with self._lock:
+            self._publish_with_retry(message)
+    
+    def _publish_with_retry(self, message: Dict[str, Any]):
+        for attempt in range(2):
+            try:
+                self._publish(self.connect(), message)
+                logger.debug("Message published to queue: %s", message.get('job_id', 'unknown'))
+                return
+            except (AMQPConnectionError, AMQPChannelError) as e:
+                self.close()
+                if attempt == 1:
+                    logger.error(f"RabbitMQ error: {str(e)}")
+                    raise Exception(f"Failed to publish message to queue: {str(e)}")
+                logger.warning(f"RabbitMQ connection lost, reconnecting: {str(e)}")
+            except AMQPError as e:
+                self.close()
+                logger.error(f"RabbitMQ error: {str(e)}")
+                raise Exception(f"Failed to publish message to queue: {str(e)}")
+    
+    def _declare_topology(self, channel):
+        """Declare exchange, queue, DLQ and binding once per channel"""
+        # Declare exchange
+        channel.exchange_declare(
+            exchange=self.exchange_name,
+            exchange_type='direct',
+            durable=True
+        )
+        
+        # Declare queue with durability and DLQ support
+        channel.queue_declare(
+            queue=self.queue_name,
+            durable=True,
+            arguments={
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': f"{self.queue_name}_dlq",
+                'x-max-priority': 10
+            }
+        )
+        
+        # Bind queue to exchange
+        channel.queue_bind(
+            exchange=self.exchange_name,
+            queue=self.queue_name,
+            routing_key=self.routing_key
+        )
+        
+        # Declare DLQ
+        channel.queue_declare(
+            queue=f"{self.queue_name}_dlq",
+            durable=True
+        )
+    
+    def _publish(self, channel, message: Dict[str, Any]):
+        """Publish a single message on the given channel
+        
+        Publisher confirms are intentionally not enabled: with
+        BlockingConnection, confirm_delivery() turns every basic_publish into
+        a synchronous broker round-trip on the request path. Persistence
+        comes from the durable queue and delivery_mode=2; enable confirms
+        on the channel in connect() if at-least-once publishing is required.
+        """
+        # Publish message with persistent delivery
+        channel.basic_publish(
+            exchange=self.exchange_name,
+            routing_key=self.routing_key,
+            body=orjson.dumps(message),
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # Make message persistent
+                content_type='application/json',
+                priority=5
             )
-            
-            logger.info(f"Message published to queue: {message.get('job_id', 'unknown')}")
-            
-        except AMQPError as e:
-            logger.error(f"RabbitMQ error: {str(e)}")
-            raise Exception(f"Failed to publish message to queue: {str(e)}")
-        finally:
-            if connection and not connection.is_closed:
-                connection.close()
+        )
+    
+    def close(self):
+        """Close the shared connection; the next publish reconnects"""
+        try:
+            if self.connection and not self.connection.is_closed:
+                self.connection.close()
+        except AMQPError:
+            pass
+        self.connection = None
+        self.channel = None
     
     def check_connection(self):
         """Check if RabbitMQ is reachable"""
@@ -4,13 +4,17 @@ import json
 from fastapi.testclient import TestClient
 from api.main import app
 
-client = TestClient(app)
+@pytest.fixture(scope="module")
+def client():
+    """Run the app's startup once so requests share the batcher's event loop"""
+    with TestClient(app) as test_client:
+        yield test_client
 
 # These tests require the services to be running
 # They're meant to be run with docker-compose exec
 
 @pytest.mark.integration
-def test_full_async_workflow():
+def test_full_async_workflow(client):
     """Test complete async workflow (requires running services)"""
     # This test would require RabbitMQ and MongoDB to be running
     # For now, we'll mock the integration
@@ -19,7 +23,7 @@ def test_full_async_workflow():
     test_text = "This is an integration test for async sentiment analysis"
     test_data = {"text": test_text}
     
-    with patch('api.endpoints.QueueService') as mock_queue:
+    with patch('api.endpoints.get_queue_service') as mock_queue:
         mock_instance = Mock()
         mock_queue.return_value = mock_instance
         
@@ -44,7 +48,7 @@ def test_full_async_workflow():
             "status": "completed"
         }
         
-        with patch('api.endpoints.DatabaseService') as mock_db:
+        with patch('api.endpoints.get_database_service') as mock_db:
             mock_db_instance = Mock()
             mock_db_instance.get_result.return_value = test_result
             mock_db.return_value = mock_db_instance
@@ -60,7 +64,7 @@ def test_full_async_workflow():
             assert result["sentiment"] == "positive"
 
 @pytest.mark.integration
-def test_service_dependencies():
+def test_service_dependencies(client):
     """Test that all service endpoints are accessible"""
     endpoints = [
         ("/", 200),
@@ -74,7 +78,7 @@ def test_service_dependencies():
         assert response.status_code == expected_status, f"Failed: {endpoint}"
 
 @pytest.mark.integration
-def test_error_handling():
+def test_error_handling(client):
     """Test error handling in API"""
     # Test invalid JSON
     response = client.post("/api/sentiment/sync", data="invalid json")
@@ -90,7 +94,7 @@ def test_error_handling():
     assert response.status_code in [400, 404, 422]
 
 @pytest.mark.integration
-def test_concurrent_requests():
+def test_concurrent_requests(client):
     """Test handling multiple concurrent requests"""
     import concurrent.futures
     
@@ -119,7 +123,7 @@ def test_concurrent_requests():
         assert data["sentiment"] in ["positive", "negative"]
 
 @pytest.mark.integration  
-def test_api_validation():
+def test_api_validation(client):
     """Test API input validation"""
     # Test text too short
     response = client.post("/api/sentiment/sync", json={"text": ""})
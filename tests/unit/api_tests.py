@@ -1,10 +1,43 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
 from api.main import app
 
 client = TestClient(app)
 
+@pytest.fixture
+def mock_batcher():
+    """Patch the shared prediction batcher and return its mock"""
+    with patch('api.endpoints.get_prediction_batcher') as mock_getter:
+        mock_getter.return_value.predict = AsyncMock(return_value=("positive", 0.92))
+        yield mock_getter.return_value
+
+@pytest.fixture
+def mock_queue_service():
+    """Patch the shared queue service and return its mock"""
+    with patch('api.endpoints.get_queue_service') as mock_getter:
+        yield mock_getter.return_value
+
+@pytest.fixture
+def mock_db_service():
+    """Patch the shared database service and return its mock"""
+    with patch('api.endpoints.get_database_service') as mock_getter:
+        mock_getter.return_value.get_result.return_value = None
+        yield mock_getter.return_value
+
+@pytest.fixture
+def mock_cache_service():
+    """Patch the shared cache service (empty by default) and return its mock"""
+    with patch('api.endpoints.get_cache_service') as mock_getter:
+        mock_getter.return_value.get_result.return_value = None
+        yield mock_getter.return_value
+
+@pytest.fixture(scope="session")
+def openapi_response():
+    """Fetch the OpenAPI schema once per test session"""
+    return client.get("/openapi.json")
+
 def test_health_check():
     """Test health check endpoint"""
     response = client.get("/health")
@@ -23,95 +56,113 @@ def test_root_endpoint():
     assert "docs" in data
     assert "endpoints" in data
 
-def test_sync_sentiment_analysis():
+@pytest.mark.parametrize("text, sentiment, score", [
+    ("I love this product! It's amazing.", "positive", 0.92),
+    ("I hate this product! It's terrible.", "negative", 0.08)
+])
+def test_sync_sentiment_analysis(mock_batcher, text, sentiment, score):
     """Test synchronous sentiment analysis endpoint"""
-    test_data = {"text": "I love this product! It's amazing."}
+    test_data = {"text": text}
+    mock_batcher.predict.return_value = (sentiment, score)
     
-    with patch('api.endpoints.load_sync_model') as mock_model:
-        mock_service = Mock()
-        mock_service.predict.return_value = ("positive", 0.92)
-        mock_model.return_value = mock_service
-        
-        response = client.post("/api/sentiment/sync", json=test_data)
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["text"] == test_data["text"][:100] + "..."
-        assert data["sentiment"] == "positive"
-        assert data["score"] == 0.92
-        assert "processing_time" in data
-
-def test_sync_sentiment_empty_text():
-    """Test sync endpoint with empty text"""
-    test_data = {"text": ""}
     response = client.post("/api/sentiment/sync", json=test_data)
-    assert response.status_code == 422  # Validation error
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["text"] == test_data["text"]
+    assert data["sentiment"] == sentiment
+    assert data["score"] == score
+    assert "processing_time" in data
+    mock_batcher.predict.assert_awaited_once_with(text)
+
+def test_sync_sentiment_truncates_long_text(mock_batcher):
+    """Test that long texts are shortened in the sync response"""
+    test_data = {"text": "great " * 50}
+    
+    response = client.post("/api/sentiment/sync", json=test_data)
+    
+    assert response.status_code == 200
+    assert response.json()["text"] == test_data["text"][:100] + "..."
 
-def test_sync_sentiment_long_text():
-    """Test sync endpoint with very long text"""
-    test_data = {"text": "a" * 1001}  # Exceeds max length
+@pytest.mark.parametrize("text", [
+    "",  # Empty text
+    "a" * 1001  # Exceeds max length
+])
+def test_sync_sentiment_invalid_text(text):
+    """Test sync endpoint with empty and very long text"""
+    test_data = {"text": text}
     response = client.post("/api/sentiment/sync", json=test_data)
     assert response.status_code == 422  # Validation error
 
-def test_async_sentiment_analysis():
+def test_sync_sentiment_invalid_json():
+    """Test sync endpoint with a malformed JSON body"""
+    response = client.post(
+        "/api/sentiment/sync",
+        content="not json",
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][0] == "body"
+
+def test_async_sentiment_analysis(mock_queue_service):
     """Test asynchronous sentiment analysis endpoint"""
     test_data = {"text": "This is a test message for async processing"}
     
-    with patch('api.endpoints.QueueService') as mock_queue:
-        mock_instance = Mock()
-        mock_queue.return_value = mock_instance
-        
-        response = client.post("/api/sentiment/async", json=test_data)
-        
-        assert response.status_code == 202  # Accepted
-        data = response.json()
-        assert "job_id" in data
-        assert data["status"] == "processing"
-        assert "message" in data
-        assert "timestamp" in data
-
-def test_get_result_not_found():
+    response = client.post("/api/sentiment/async", json=test_data)
+    
+    assert response.status_code == 202  # Accepted
+    data = response.json()
+    assert "job_id" in data
+    assert data["status"] == "processing"
+    assert "message" in data
+    assert "timestamp" in data
+    mock_queue_service.publish_message.assert_called_once()
+
+def test_get_result_not_found(mock_db_service, mock_cache_service):
     """Test getting non-existent result"""
-    with patch('api.endpoints.DatabaseService') as mock_db:
-        mock_instance = Mock()
-        mock_instance.get_result.return_value = None
-        mock_db.return_value = mock_instance
-        
-        response = client.get("/api/sentiment/results/nonexistent-id")
-        
-        assert response.status_code == 404
-        data = response.json()
-        assert "detail" in data
-
-def test_get_result_found():
+    response = client.get("/api/sentiment/results/nonexistent-id")
+    
+    assert response.status_code == 404
+    data = response.json()
+    assert "detail" in data
+
+def test_get_result_found(mock_db_service, mock_cache_service):
     """Test getting existing result"""
     test_result = {
         "job_id": "test-id-123",
         "text": "Test text",
         "sentiment": "positive",
         "score": 0.85,
-        "timestamp": "2024-01-21T10:30:00",
-        "processed_at": "2024-01-21T10:30:02",
-        "status": "completed"
+        "timestamp": datetime(2024, 1, 21, 10, 30, 0),
+        "processed_at": datetime(2024, 1, 21, 10, 30, 2)
     }
+    mock_db_service.get_result.return_value = test_result
+    
+    response = client.get("/api/sentiment/results/test-id-123")
     
-    with patch('api.endpoints.DatabaseService') as mock_db:
-        mock_instance = Mock()
-        mock_instance.get_result.return_value = test_result
-        mock_db.return_value = mock_instance
-        
-        response = client.get("/api/sentiment/results/test-id-123")
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["job_id"] == "test-id-123"
-        assert data["sentiment"] == "positive"
-        assert "processing_time" in data
-
-def test_api_docs_available():
+    assert response.status_code == 200
+    data = response.json()
+    assert data["job_id"] == "test-id-123"
+    assert data["sentiment"] == "positive"
+    assert data["processing_time"] == 2.0
+    mock_cache_service.set_result.assert_called_once()
+
+def test_get_result_from_cache(mock_db_service, mock_cache_service):
+    """Test that cached results are served without querying MongoDB"""
+    cached = b'{"job_id":"test-id-123","text":"Test text","sentiment":"positive","score":0.85,' \
+             b'"timestamp":"2024-01-21T10:30:00","processed_at":"2024-01-21T10:30:02","processing_time":2.0}'
+    mock_cache_service.get_result.return_value = cached
+    
+    response = client.get("/api/sentiment/results/test-id-123")
+    
+    assert response.status_code == 200
+    assert response.json()["processing_time"] == 2.0
+    mock_db_service.get_result.assert_not_called()
+
+def test_api_docs_available(openapi_response):
     """Test that API documentation is available"""
     response = client.get("/docs")
     assert response.status_code == 200
     
-    response = client.get("/openapi.json")
-    assert response.status_code == 200
+    assert openapi_response.status_code == 200
+    assert "/api/sentiment/sync" in openapi_response.json()["paths"]
@@ -1,10 +1,14 @@
 import pytest
+import asyncio
 import json
-from unittest.mock import Mock, patch
+import threading
+from unittest.mock import Mock, call, patch
 from api.services.queue_service import QueueService
 from api.services.database_service import DatabaseService
+from api.services.batching_service import PredictionBatcher
 from worker.services.model_service import ModelService
 from worker.services.database_service import DatabaseService as WorkerDatabaseService
+from worker.main import SentimentWorker
 
 def test_queue_service_initialization():
     """Test QueueService initialization"""
@@ -31,6 +35,23 @@ def test_queue_service_publish_message():
         # Verify message was published
         mock_channel.basic_publish.assert_called()
 
+def test_queue_service_reuses_connection():
+    """Test that consecutive publishes share one RabbitMQ connection"""
+    queue_service = QueueService()
+    mock_conn = Mock()
+    mock_conn.is_closed = False
+    mock_conn.channel.return_value.is_closed = False
+    
+    with patch.object(queue_service, '_create_connection', return_value=mock_conn) as mock_create:
+        queue_service.publish_message({"job_id": "test-1", "text": "First"})
+        queue_service.publish_message({"job_id": "test-2", "text": "Second"})
+    
+    mock_create.assert_called_once()
+    # Topology is declared when the channel opens, not on every publish
+    mock_conn.channel.return_value.exchange_declare.assert_called_once()
+    assert mock_conn.channel.return_value.basic_publish.call_count == 2
+    mock_conn.close.assert_not_called()
+
 def test_database_service_connection():
     """Test DatabaseService connection"""
     with patch('pymongo.MongoClient') as mock_client:
@@ -68,6 +89,7 @@ def test_database_service_get_result():
         assert result is not None
         assert result["job_id"] == "test-123"
 
+@pytest.mark.slow
 def test_model_service_initialization():
     """Test ModelService initialization"""
     with patch('tensorflow.keras.models.load_model') as mock_load_model:
@@ -76,6 +98,7 @@ def test_model_service_initialization():
             assert model_service.model is not None
             assert model_service.tokenizer is not None
 
+@pytest.mark.slow
 def test_model_service_predict():
     """Test sentiment prediction"""
     model_service = ModelService()
@@ -90,34 +113,145 @@ def test_model_service_predict():
     assert sentiment in ["positive", "negative", "neutral"]
     assert 0 <= score <= 1
 
-def test_worker_database_service():
+@pytest.mark.slow
+def test_model_service_preprocess_matches_keras():
+    """Test that the buffer tokenizer matches texts_to_sequences + pad_sequences"""
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+    model_service = ModelService()
+    texts = [
+        "I LOVE this product!!",
+        "Terrible, terrible... support; unknownword",
+        "",
+        "great " * 200,
+        # Longer than max_length with different words at each end
+        "I love this product " * 20 + "terrible poor support " * 30
+    ]
+    
+    # Truncation is pad_sequences' default 'pre', as in create_dummy_model.py
+    expected = pad_sequences(
+        model_service.tokenizer.texts_to_sequences(texts),
+        maxlen=model_service.max_length,
+        padding='post'
+    )
+    assert (model_service.preprocess_batch(texts) == expected).all()
+    # A smaller batch reuses the buffer without leaking earlier rows
+    assert (model_service.preprocess_batch(texts[2:3]) == 0).all()
+
+@pytest.mark.slow
+def test_model_service_fused_pipeline_matches_numpy():
+    """Test that the fused tf.function tokenizes like preprocess_batch"""
+    import numpy as np
+    import tensorflow as tf
+    model_service = ModelService()
+    assert model_service._predict_texts_fn is not None
+    texts = [
+        "I LOVE this product!!",
+        "Terrible, terrible... support; unknownword",
+        "",
+        "great " * 200,
+        # Longer than max_length with different words at each end
+        "I love this product " * 20 + "terrible poor support " * 30
+    ]
+    
+    fused = model_service._predict_texts_fn(tf.constant(texts)).numpy()
+    expected = model_service._predict_fn(tf.constant(model_service.preprocess_batch(texts))).numpy()
+    assert np.allclose(fused, expected)
+
+def test_model_service_prediction_cache():
+    """Test that repeated texts are scored once and served from the LRU"""
+    from collections import OrderedDict
+    model_service = ModelService.__new__(ModelService)
+    model_service.tokenizer = None
+    model_service.cache_size = 2
+    model_service._cache = OrderedDict()
+    model_service._cache_lock = threading.Lock()
+    model_service._predict_uncached = Mock(side_effect=lambda texts: [("positive", 0.9)] * len(texts))
+    
+    assert model_service.predict_batch(["Great!", "great!", "Thanks"]) == [("positive", 0.9)] * 3
+    model_service._predict_uncached.assert_called_once_with(["Great!", "Thanks"])
+    
+    model_service._predict_uncached.reset_mock()
+    model_service.predict_batch(["GREAT!", "new text"])
+    model_service._predict_uncached.assert_called_once_with(["new text"])
+    # "thanks" was least recently used and has been evicted
+    assert list(model_service._cache) == ["great!", "new text"]
+    
+    model_service._predict_uncached.side_effect = Exception("model error")
+    assert model_service.predict_batch(["unseen"]) == [("neutral", 0.5)]
+    assert "unseen" not in model_service._cache
+
+@pytest.fixture
+def mock_worker_mongo():
+    """Patch the worker's MongoClient and reset the process-wide client around the test"""
+    WorkerDatabaseService._client = None
+    with patch('worker.services.database_service.MongoClient') as mock_client:
+        yield mock_client
+    WorkerDatabaseService._client = None
+
+def test_worker_database_service(mock_worker_mongo):
     """Test worker database service"""
-    with patch('pymongo.MongoClient') as mock_client:
-        mock_instance = Mock()
-        mock_collection = Mock()
-        
-        mock_instance.sentiment_db.sentiment_results = mock_collection
-        mock_client.return_value = mock_instance
-        
-        db_service = WorkerDatabaseService()
-        db_service.client = mock_instance
-        db_service.collection = mock_collection
-        
-        # Test save result
-        test_result = {
-            "job_id": "test-123",
-            "text": "Test text",
-            "sentiment": "positive",
-            "score": 0.85
-        }
-        
-        db_service.save_result(test_result)
-        mock_collection.insert_one.assert_called_with(test_result)
-        
-        # Test get result
-        mock_collection.find_one.return_value = test_result
-        result = db_service.get_result("test-123")
-        assert result["job_id"] == "test-123"
+    mock_collection = mock_worker_mongo.return_value.sentiment_db.sentiment_results
+    
+    db_service = WorkerDatabaseService()
+    assert db_service.collection is mock_collection
+    mock_collection.create_index.assert_called_once_with("job_id", unique=True)
+    
+    # Test save result
+    test_result = {
+        "job_id": "test-123",
+        "text": "Test text",
+        "sentiment": "positive",
+        "score": 0.85
+    }
+    
+    db_service.save_result(test_result)
+    mock_collection.update_one.assert_called_with(
+        {"job_id": "test-123"},
+        {"$setOnInsert": test_result},
+        upsert=True
+    )
+    
+    # Test get result
+    mock_collection.find_one.return_value = test_result
+    result = db_service.get_result("test-123")
+    assert result["job_id"] == "test-123"
+
+def test_worker_database_service_shares_client(mock_worker_mongo):
+    """Test that instances in one process reuse a single MongoClient"""
+    WorkerDatabaseService()
+    WorkerDatabaseService()
+    mock_worker_mongo.assert_called_once()
+
+def test_worker_database_service_save_results(mock_worker_mongo):
+    """Test that a batch of results is written with one bulk upsert"""
+    mock_collection = mock_worker_mongo.return_value.sentiment_db.sentiment_results
+    db_service = WorkerDatabaseService()
+    
+    results = [
+        {"job_id": "test-1", "sentiment": "positive", "score": 0.9},
+        {"job_id": "test-2", "sentiment": "negative", "score": 0.1}
+    ]
+    
+    mock_collection.bulk_write.return_value.upserted_ids = {0: "id-1"}
+    
+    # test-2 matched an existing job, so only test-1 was inserted
+    assert db_service.save_results(results) == ({0}, set())
+    mock_collection.bulk_write.assert_called_once()
+    operations = mock_collection.bulk_write.call_args[0][0]
+    assert len(operations) == 2
+    assert mock_collection.bulk_write.call_args[1] == {"ordered": False}
+
+def test_worker_database_service_existing_job_ids(mock_worker_mongo):
+    """Test that duplicate checks for a batch use a single $in query"""
+    mock_collection = mock_worker_mongo.return_value.sentiment_db.sentiment_results
+    mock_collection.find.return_value = [{"job_id": "test-1"}]
+    db_service = WorkerDatabaseService()
+    
+    assert db_service.get_existing_job_ids(["test-1", "test-2"]) == {"test-1"}
+    mock_collection.find.assert_called_once_with(
+        {"job_id": {"$in": ["test-1", "test-2"]}},
+        projection={"_id": 0, "job_id": 1}
+    )
 
 def test_queue_service_connection_check():
     """Test RabbitMQ connection check"""
@@ -143,3 +277,183 @@ def test_database_service_connection_check():
         
         mock_command.side_effect = Exception("Connection failed")
         assert db_service.check_connection() is False
+
+def test_prediction_batcher_groups_concurrent_requests():
+    """Test that concurrent sync predictions share one model call"""
+    mock_model = Mock()
+    mock_model.predict_batch.side_effect = lambda texts: [("positive", 0.9)] * len(texts)
+    batcher = PredictionBatcher(mock_model, max_batch_size=8, max_wait=0.05)
+    
+    async def run():
+        batcher.start()
+        results = await asyncio.gather(*(batcher.predict(f"text {i}") for i in range(5)))
+        batcher.stop()
+        return results
+    
+    results = asyncio.run(run())
+    assert results == [("positive", 0.9)] * 5
+    mock_model.predict_batch.assert_called_once()
+    assert len(mock_model.predict_batch.call_args[0][0]) == 5
+
+def test_prediction_batcher_rejects_other_event_loops():
+    """Test that the batcher stays bound to the loop it was started on"""
+    batcher = PredictionBatcher(Mock())
+    
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.predict("not started"))
+    
+    startup_loop = asyncio.new_event_loop()
+    
+    async def start():
+        batcher.start()
+    startup_loop.run_until_complete(start())
+    
+    try:
+        with pytest.raises(RuntimeError):
+            asyncio.run(batcher.predict("other loop"))
+        with pytest.raises(RuntimeError):
+            asyncio.run(start())
+    finally:
+        batcher.stop()
+        startup_loop.run_until_complete(asyncio.sleep(0))
+        startup_loop.close()
+
+def test_worker_settle_batch_multi_ack():
+    """Test that a batch is acked with multiple=True and failures are nacked singly"""
+    worker = SentimentWorker.__new__(SentimentWorker)
+    worker.channel = Mock()
+    
+    worker.settle_batch([(1, True), (2, True), (3, True)])
+    worker.channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+    worker.channel.basic_nack.assert_not_called()
+    
+    worker.channel.reset_mock()
+    worker.settle_batch([(4, True), (5, False), (6, True)])
+    worker.channel.basic_nack.assert_called_once_with(delivery_tag=5, requeue=True)
+    assert worker.channel.basic_ack.call_args_list == [
+        call(delivery_tag=4, multiple=True),
+        call(delivery_tag=6, multiple=True)
+    ]
+
+def test_worker_run_batch_settles_on_connection_thread():
+    """Test that batch acks are handed back to the connection via add_callback_threadsafe"""
+    worker = SentimentWorker.__new__(SentimentWorker)
+    worker.worker_id = "test"
+    worker.channel = Mock()
+    worker.connection = Mock()
+    worker._metrics_lock = threading.Lock()
+    worker.metrics = {"total_failed": 0}
+    worker.process_batch = Mock(return_value=[(1, True), (2, True)])
+    
+    worker.run_batch([(1, {}), (2, {})])
+    worker.channel.basic_ack.assert_not_called()
+    
+    callback = worker.connection.add_callback_threadsafe.call_args[0][0]
+    callback()
+    worker.channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+    
+    # When every message also fails alone, all are requeued for retry
+    worker.process_batch.side_effect = Exception("MongoDB down")
+    worker.run_batch([(3, {}), (4, {})])
+    worker.connection.add_callback_threadsafe.call_args[0][0]()
+    assert worker.channel.basic_nack.call_args_list == [
+        call(delivery_tag=3, requeue=True),
+        call(delivery_tag=4, requeue=True)
+    ]
+    assert worker.metrics["total_failed"] == 2
+
+def test_worker_run_batch_rejects_message_that_breaks_batch():
+    """Test that a failed batch is retried singly and only the bad message is dead-lettered"""
+    worker = SentimentWorker.__new__(SentimentWorker)
+    worker.worker_id = "test"
+    worker.channel = Mock()
+    worker.connection = Mock()
+    worker._metrics_lock = threading.Lock()
+    worker.metrics = {"total_failed": 0}
+    
+    def process_batch(batch):
+        if len(batch) > 1 or batch[0][0] == 2:
+            raise Exception("bad message")
+        return [(batch[0][0], True)]
+    worker.process_batch = Mock(side_effect=process_batch)
+    
+    worker.run_batch([(1, {"job_id": "a"}), (2, {"job_id": "b"}), (3, {"job_id": "c"})])
+    worker.connection.add_callback_threadsafe.call_args[0][0]()
+    
+    worker.channel.basic_nack.assert_called_once_with(delivery_tag=2, requeue=False)
+    assert worker.channel.basic_ack.call_args_list == [
+        call(delivery_tag=1, multiple=True),
+        call(delivery_tag=3, multiple=True)
+    ]
+    assert worker.metrics["total_failed"] == 1
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[]",
+    b'{"job_id": "job-1", "text": null}',
+    b'{"job_id": 5, "text": "hello"}',
+    b'{"job_id": "job-1", "text": "hello", "timestamp": 123}'
+])
+def test_worker_process_message_rejects_invalid_messages(body):
+    """Test that messages that can never be processed go straight to the DLQ"""
+    worker = SentimentWorker.__new__(SentimentWorker)
+    worker.worker_id = "test"
+    worker._metrics_lock = threading.Lock()
+    worker.metrics = {"total_failed": 0}
+    worker.pending = []
+    channel = Mock()
+    
+    worker.process_message(channel, Mock(delivery_tag=7), None, body)
+    
+    channel.basic_nack.assert_called_once_with(delivery_tag=7, requeue=False)
+    assert worker.pending == []
+    assert worker.metrics["total_failed"] == 1
+
+def test_worker_setup_rabbitmq_declares_topology_once():
+    """Test that reconnecting reuses the connection parameters and skips redeclaring"""
+    worker = SentimentWorker.__new__(SentimentWorker)
+    worker.worker_id = "test"
+    worker.queue_name = "sentiment_analysis_queue"
+    worker.dlq_name = "sentiment_analysis_queue_dlq"
+    worker.prefetch_count = 100
+    worker._connection_params = Mock()
+    worker._topology_declared = False
+    
+    with patch('pika.BlockingConnection') as mock_connection:
+        channel = mock_connection.return_value.channel.return_value
+        
+        worker.setup_rabbitmq()
+        worker.setup_rabbitmq()
+        
+        assert mock_connection.call_args_list == [call(worker._connection_params)] * 2
+        channel.exchange_declare.assert_called_once()
+        assert channel.queue_declare.call_count == 2
+        assert channel.basic_qos.call_args_list == [call(prefetch_count=100)] * 2
+
+def test_worker_process_batch_skips_racing_duplicates():
+    """Test that only inserted results are cached and counted as processed"""
+    worker = SentimentWorker.__new__(SentimentWorker)
+    worker.worker_id = "test"
+    worker.log_every = 1000
+    worker._metrics_lock = threading.Lock()
+    worker.metrics = {"total_processed": 0, "total_failed": 0, "total_duplicates": 0, "start_time": 0}
+    worker.db_service = Mock()
+    worker.db_service.get_existing_job_ids.return_value = set()
+    # job-2 was stored by another worker between the check and the upsert
+    worker.db_service.save_results.return_value = ({0}, set())
+    worker.model_service = Mock()
+    worker.model_service.predict_batch.return_value = [("positive", 0.9), ("negative", 0.1)]
+    worker.cache_result = Mock()
+    
+    outcomes = worker.process_batch([(1, {"job_id": "job-1", "text": "a"}), (2, {"job_id": "job-2", "text": "b"})])
+    
+    assert outcomes == [(1, True), (2, True)]
+    worker.cache_result.assert_called_once()
+    assert worker.cache_result.call_args[0][0]["job_id"] == "job-1"
+    assert worker.metrics["total_processed"] == 1
+    assert worker.metrics["total_duplicates"] == 1
+    
+    # Dates are stored and cached at BSON's millisecond precision
+    result = worker.db_service.save_results.call_args[0][0][0]
+    assert result["timestamp"].microsecond % 1000 == 0
+    assert result["processed_at"].microsecond % 1000 == 0
@@ -1,29 +1,91 @@
-import json
+import functools
 import logging
+import multiprocessing
 import os
+import secrets
+import threading
 import time
-import uuid
-from datetime import datetime
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from worker.services.model_service import ModelService
 from worker.services.database_service import DatabaseService
+from worker.services.cache_service import CacheService
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+def parse_timestamp(value):
+    """Parse an ISO-8601 submission timestamp into a naive UTC datetime
+    
+    Naive UTC is how PyMongo stores and returns BSON dates, so results keep
+    native datetimes end to end. Missing or malformed values fall back to now.
+    """
+    if value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid job timestamp {value!r}, using current time")
+    return datetime.utcnow()
+
+def to_bson_precision(value):
+    """Truncate a datetime to the milliseconds a BSON date can hold
+    
+    Cached bodies are built from these values, so they must match what the
+    API later reads back from MongoDB.
+    """
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def validate_message(message):
+    """Return why a decoded job message can never be processed, or None"""
+    if not isinstance(message, dict):
+        return "message is not a JSON object"
+    if not isinstance(message.get("job_id"), str) or not message["job_id"]:
+        return "job_id must be a non-empty string"
+    if not isinstance(message.get("text"), str):
+        return "text must be a string"
+    if not isinstance(message.get("timestamp", ""), (str, type(None))):
+        return "timestamp must be a string"
+    return None
+
 class SentimentWorker:
     def __init__(self):
-        self.worker_id = str(uuid.uuid4())[:8]
+        self.worker_id = secrets.token_hex(4)
         self.model_service = ModelService()
         self.db_service = DatabaseService()
+        self.cache_service = CacheService()
         self.queue_name = "sentiment_analysis_queue"
         self.dlq_name = f"{self.queue_name}_dlq"
+        
+        # Micro-batching: messages are buffered and scored together, flushed
+        # when the batch is full or batch_timeout seconds after the first one
+        self.batch_size = int(os.getenv("WORKER_BATCH_SIZE", 16))
+        self.batch_timeout = float(os.getenv("WORKER_BATCH_TIMEOUT_MS", 50)) / 1000
+        # Unacked deliveries the broker may push ahead; at least one batch
+        self.prefetch_count = max(int(os.getenv("WORKER_PREFETCH_COUNT", 100)), self.batch_size)
+        self.pending = []
+        self._flush_timer = None
+        # Per-job logs are DEBUG; INFO gets a rollup every log_every jobs
+        self.log_every = int(os.getenv("WORKER_LOG_EVERY", 1000))
+        # Batches are scored and stored off the connection thread so AMQP I/O
+        # (deliveries, acks, heartbeats) keeps flowing during inference. One
+        # thread keeps batches settling in delivery order, which the
+        # multiple=True acks in settle_batch rely on.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch")
+        
+        self._connection_params = self._build_connection_params()
+        self._topology_declared = False
         self.setup_rabbitmq()
         
-        # Metrics
+        # Metrics; updated from both the connection and the batch thread
+        self._metrics_lock = threading.Lock()
         self.metrics = {
             "total_processed": 0,
             "total_failed": 0,
@@ -33,67 +95,50 @@ class SentimentWorker:
         
         logger.info(f"Worker {self.worker_id} initialized")
     
-    def setup_rabbitmq(self):
-        """Setup RabbitMQ connection and channel with retry logic"""
+    def _build_connection_params(self):
+        """Read RabbitMQ settings once and build the connection parameters"""
         import pika
-        import pika.exceptions
         
         self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq")
         self.rabbitmq_port = int(os.getenv("RABBITMQ_PORT", 5672))
         self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
         self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
         
+        credentials = pika.PlainCredentials(self.rabbitmq_user, self.rabbitmq_password)
+        return pika.ConnectionParameters(
+            host=self.rabbitmq_host,
+            port=self.rabbitmq_port,
+            credentials=credentials,
+            heartbeat=600,
+            blocked_connection_timeout=300,
+            connection_attempts=3,
+            retry_delay=5
+        )
+    
+    def setup_rabbitmq(self):
+        """Setup RabbitMQ connection and channel with retry logic
+        
+        Topology is declared on the first successful connection only; a
+        reconnect just reopens the channel and restores prefetch.
+        """
+        import pika
+        import pika.exceptions
+        
         max_retries = 5
         retry_delay = 5
         
         for attempt in range(max_retries):
             try:
-                credentials = pika.PlainCredentials(self.rabbitmq_user, self.rabbitmq_password)
-                parameters = pika.ConnectionParameters(
-                    host=self.rabbitmq_host,
-                    port=self.rabbitmq_port,
-                    credentials=credentials,
-                    heartbeat=600,
-                    blocked_connection_timeout=300,
-                    connection_attempts=3,
-                    retry_delay=5
-                )
-                self.connection = pika.BlockingConnection(parameters)
+                self.connection = pika.BlockingConnection(self._connection_params)
                 self.channel = self.connection.channel()
                 
-                # Declare exchange
-                self.channel.exchange_declare(
-                    exchange='sentiment_exchange',
-                    exchange_type='direct',
-                    durable=True
-                )
-                
-                # Declare main queue
-                self.channel.queue_declare(
-                    queue=self.queue_name,
-                    durable=True,
-                    arguments={
-                        'x-dead-letter-exchange': '',
-                        'x-dead-letter-routing-key': self.dlq_name,
-                        'x-max-priority': 10
-                    }
-                )
-                
-                # Bind queue to exchange
-                self.channel.queue_bind(
-                    exchange='sentiment_exchange',
-                    queue=self.queue_name,
-                    routing_key='sentiment.job'
-                )
+                if not self._topology_declared:
+                    self._declare_topology(self.channel)
+                    self._topology_declared = True
                 
-                # Declare DLQ
-                self.channel.queue_declare(
-                    queue=self.dlq_name,
-                    durable=True
-                )
-                
-                # Set QoS to prevent overloading
-                self.channel.basic_qos(prefetch_count=1)
+                # Bounded prefetch keeps the next batches in flight without
+                # letting one worker hoard the queue
+                self.channel.basic_qos(prefetch_count=self.prefetch_count)
                 
                 logger.info(f"Worker {self.worker_id} connected to RabbitMQ (attempt {attempt + 1})")
                 return
@@ -106,74 +151,249 @@ class SentimentWorker:
                     logger.error(f"Worker {self.worker_id} max retries reached. Exiting...")
                     raise
     
+    def _declare_topology(self, channel):
+        """Declare exchange, queue, DLQ and binding"""
+        # Declare exchange
+        channel.exchange_declare(
+            exchange='sentiment_exchange',
+            exchange_type='direct',
+            durable=True
+        )
+        
+        # Declare main queue
+        channel.queue_declare(
+            queue=self.queue_name,
+            durable=True,
+            arguments={
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': self.dlq_name,
+                'x-max-priority': 10
+            }
+        )
+        
+        # Bind queue to exchange
+        channel.queue_bind(
+            exchange='sentiment_exchange',
+            queue=self.queue_name,
+            routing_key='sentiment.job'
+        )
+        
+        # Declare DLQ
+        channel.queue_declare(
+            queue=self.dlq_name,
+            durable=True
+        )
+    
     def process_message(self, ch, method, properties, body):
-        """Process incoming message from queue"""
-        message = None
-        job_id = "unknown"
+        """Buffer an incoming message; flush once a full batch is pending"""
+        try:
+            message = orjson.loads(body)
+            error = validate_message(message)
+        except orjson.JSONDecodeError as e:
+            error = f"invalid JSON: {str(e)}"
+        
+        if error is not None:
+            logger.error(f"Worker {self.worker_id} invalid message: {error}")
+            # Reject without requeue (send to DLQ); retrying cannot fix it
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self.count_metric("total_failed")
+            return
         
+        self.pending.append((method.delivery_tag, message))
+        
+        if len(self.pending) >= self.batch_size:
+            self.flush_batch()
+        elif self._flush_timer is None:
+            self._flush_timer = self.connection.call_later(self.batch_timeout, self.flush_batch)
+    
+    def flush_batch(self):
+        """Hand all pending messages to the batch thread as one batch"""
+        if self._flush_timer is not None:
+            self.connection.remove_timeout(self._flush_timer)
+            self._flush_timer = None
+        
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        
+        self._executor.submit(self.run_batch, batch)
+    
+    def run_batch(self, batch):
+        """Process a batch on the batch thread and settle it on the connection thread
+        
+        pika connections are not thread-safe; add_callback_threadsafe queues
+        the acks to run inside the connection's own event processing.
+        """
+        rejected = set()
         try:
-            message = json.loads(body)
+            outcomes = self.process_batch(batch)
+        except Exception as e:
+            logger.error(f"Worker {self.worker_id} error processing batch of {len(batch)} jobs: {str(e)}")
+            outcomes, rejected = self.process_singly(batch)
+        self.connection.add_callback_threadsafe(functools.partial(self.settle_batch, outcomes, rejected))
+    
+    def process_singly(self, batch):
+        """Retry a failed batch one message at a time
+        
+        Isolates a message that breaks its batch so the others are still
+        stored. When some messages succeed alone, the ones that still fail
+        are rejected to the DLQ instead of requeued, since the fault is in the
+        message; if every message fails the cause is likely MongoDB or Redis,
+        so all are requeued for retry.
+        Returns (outcomes, rejected delivery tags).
+        """
+        outcomes = []
+        for delivery_tag, message in batch:
+            try:
+                outcomes.extend(self.process_batch([(delivery_tag, message)]))
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} error processing job {message.get('job_id')}: {str(e)}")
+                self.count_metric("total_failed")
+                outcomes.append((delivery_tag, False))
+        
+        failed = {delivery_tag for delivery_tag, succeeded in outcomes if not succeeded}
+        if len(batch) > 1 and len(failed) < len(batch):
+            return outcomes, failed
+        return outcomes, set()
+    
+    def process_batch(self, batch):
+        """Score, store and cache a batch; return (delivery_tag, succeeded) pairs"""
+        succeeded = {}
+        jobs = []
+        # Check for duplicate processing (idempotency) with one query per
+        # batch; seen also catches redeliveries within the same batch
+        seen = self.db_service.get_existing_job_ids(
+            [message.get("job_id", "unknown") for _, message in batch]
+        )
+        for delivery_tag, message in batch:
             job_id = message.get("job_id", "unknown")
-            text = message.get("text", "")
-            timestamp_str = message.get("timestamp", datetime.now().isoformat())
-            
-            logger.info(f"Worker {self.worker_id} processing job: {job_id}")
-            
-            # Check for duplicate processing (idempotency)
-            existing_result = self.db_service.get_result(job_id)
-            if existing_result:
-                logger.warning(f"Worker {self.worker_id} skipping duplicate job: {job_id}")
-                self.metrics["total_duplicates"] += 1
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-                return
-            
-            # Perform sentiment analysis
-            start_time = time.time()
-            sentiment, score = self.model_service.predict(text)
-            processing_time = time.time() - start_time
-            
-            # Create result document
-            result = {
-                "job_id": job_id,
-                "text": text,
-                "sentiment": sentiment,
-                "score": float(score),
-                "timestamp": timestamp_str,
-                "processed_at": datetime.now().isoformat(),
-                "worker_id": self.worker_id,
-                "processing_time": processing_time,
-                "status": "completed"
-            }
+            logger.debug("Worker %s processing job: %s", self.worker_id, job_id)
             
-            # Store result in MongoDB
-            self.db_service.save_result(result)
+            if job_id in seen:
+                logger.warning("Worker %s skipping duplicate job: %s", self.worker_id, job_id)
+                self.count_metric("total_duplicates")
+                succeeded[delivery_tag] = True
+                continue
+            seen.add(job_id)
+            jobs.append((delivery_tag, message))
+        
+        if jobs:
+            processed_before = self.get_metrics()["total_processed"]
+            # Perform sentiment analysis for the whole batch
+            start_time = time.perf_counter()
+            predictions = self.model_service.predict_batch([job.get("text", "") for _, job in jobs])
+            processing_time = (time.perf_counter() - start_time) / len(jobs)
+            # The batch completes together: read the wall clock once
+            processed_at = to_bson_precision(datetime.utcnow())
             
-            self.metrics["total_processed"] += 1
-            logger.info(f"Worker {self.worker_id} completed job: {job_id} - {sentiment} ({score:.4f}) in {processing_time:.3f}s")
+            results = [
+                {
+                    "job_id": job.get("job_id", "unknown"),
+                    "text": job.get("text", ""),
+                    "sentiment": sentiment,
+                    "score": float(score),
+                    "timestamp": to_bson_precision(parse_timestamp(job.get("timestamp"))),
+                    "processed_at": processed_at,
+                    "worker_id": self.worker_id,
+                    "processing_time": processing_time,
+                    "status": "completed"
+                }
+                for (_, job), (sentiment, score) in zip(jobs, predictions)
+            ]
             
-            # Acknowledge message
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            # Store all results in one MongoDB round-trip
+            inserted, failed = self.db_service.save_results(results)
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Worker {self.worker_id} invalid JSON for job {job_id}: {str(e)}")
-            # Reject without requeue (send to DLQ)
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-            self.metrics["total_failed"] += 1
+            for index, ((delivery_tag, _), result) in enumerate(zip(jobs, results)):
+                job_id = result["job_id"]
+                if index in failed:
+                    logger.error(f"Worker {self.worker_id} error storing job {job_id}")
+                    self.count_metric("total_failed")
+                    succeeded[delivery_tag] = False
+                    continue
+                if index not in inserted:
+                    # Another worker stored this job first; its result is kept
+                    logger.warning("Worker %s skipping duplicate job: %s", self.worker_id, job_id)
+                    self.count_metric("total_duplicates")
+                    succeeded[delivery_tag] = True
+                    continue
+                
+                # Warm the API's result cache
+                self.cache_result(result)
+                self.count_metric("total_processed")
+                succeeded[delivery_tag] = True
+                logger.debug("Worker %s completed job: %s - %s (%.4f) in %.3fs",
+                             self.worker_id, job_id, result["sentiment"], result["score"], processing_time)
             
+            self.log_progress(processed_before)
+        
+        return [(delivery_tag, succeeded[delivery_tag]) for delivery_tag, _ in batch]
+    
+    def log_progress(self, processed_before):
+        """Log a metrics rollup each time another log_every jobs complete"""
+        metrics = self.get_metrics()
+        if metrics["total_processed"] // self.log_every > processed_before // self.log_every:
+            logger.info(f"Worker {self.worker_id} processed {metrics['total_processed']} jobs "
+                        f"({metrics['processing_rate']:.1f}/s, {metrics['total_failed']} failed, "
+                        f"{metrics['total_duplicates']} duplicates)")
+    
+    def settle_batch(self, outcomes, rejected=()):
+        """Ack/nack a batch given (delivery_tag, succeeded) pairs in delivery order
+        
+        Deliveries on a channel are ordered and earlier batches are already
+        settled, so each run of successes is acked with a single
+        multiple=True ack on its last tag; failures are nacked individually
+        so the rest of the batch's progress is kept. They are requeued,
+        except tags in rejected, which go to the DLQ.
+        """
+        last_success = None
+        for delivery_tag, succeeded in outcomes:
+            if succeeded:
+                last_success = delivery_tag
+                continue
+            if last_success is not None:
+                self.channel.basic_ack(delivery_tag=last_success, multiple=True)
+                last_success = None
+            self.channel.basic_nack(delivery_tag=delivery_tag, requeue=delivery_tag not in rejected)
+        
+        if last_success is not None:
+            self.channel.basic_ack(delivery_tag=last_success, multiple=True)
+    
+    def cache_result(self, result):
+        """Write the API's response body for a stored result to Redis"""
+        try:
+            timestamp = result["timestamp"]
+            processed_at = result["processed_at"]
+            # orjson encodes datetimes natively, matching the API's own body
+            payload = {
+                "job_id": result["job_id"],
+                "text": result["text"],
+                "sentiment": result["sentiment"],
+                "score": result["score"],
+                "timestamp": timestamp,
+                "processed_at": processed_at,
+                "processing_time": (processed_at - timestamp).total_seconds()
+            }
+            self.cache_service.set_result(result["job_id"], orjson.dumps(payload))
         except Exception as e:
-            logger.error(f"Worker {self.worker_id} error processing job {job_id}: {str(e)}")
-            # Reject with requeue (retry)
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-            self.metrics["total_failed"] += 1
+            # The result is already stored; the API falls back to MongoDB
+            logger.warning(f"Worker {self.worker_id} could not cache job {result['job_id']}: {str(e)}")
+    
+    def count_metric(self, name, amount=1):
+        """Increment a metrics counter"""
+        with self._metrics_lock:
+            self.metrics[name] += amount
     
     def get_metrics(self):
         """Get worker metrics"""
-        uptime = time.time() - self.metrics["start_time"]
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        uptime = time.time() - metrics["start_time"]
         return {
-            **self.metrics,
+            **metrics,
             "worker_id": self.worker_id,
             "uptime": uptime,
-            "processing_rate": self.metrics["total_processed"] / uptime if uptime > 0 else 0
+            "processing_rate": metrics["total_processed"] / uptime if uptime > 0 else 0
         }
     
     def start(self):
@@ -193,15 +413,82 @@ class SentimentWorker:
             
         except KeyboardInterrupt:
             logger.info(f"Worker {self.worker_id} shutting down...")
+            self.drain()
             metrics = self.get_metrics()
             logger.info(f"Final metrics: {metrics}")
             if self.connection and not self.connection.is_closed:
                 self.connection.close()
         except Exception as e:
             logger.error(f"Worker {self.worker_id} error: {str(e)}")
+            self._executor.shutdown(wait=False)
             if self.connection and not self.connection.is_closed:
                 self.connection.close()
+    
+    def drain(self):
+        """Finish in-flight batches and send their acks before closing"""
+        self.flush_batch()
+        self._executor.shutdown(wait=True)
+        if self.connection and not self.connection.is_closed:
+            # Runs the settle callbacks queued by the batch thread
+            self.connection.process_data_events(time_limit=0)
 
-if __name__ == "__main__":
+def configure_process(index: int):
+    """Pin a worker process to one core and run TensorFlow single-threaded
+    
+    With one process per core, TF's own thread pools would only
+    oversubscribe the cores the other processes are using.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cores[index % len(cores)]})
+    
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def prepare_model():
+    """Create missing model artifacts once, before workers race to write them"""
+    ModelService()
+
+def run_worker(index: int = 0, processes: int = 1):
+    """Run one SentimentWorker until it is stopped"""
+    if processes > 1:
+        configure_process(index)
     worker = SentimentWorker()
     worker.start()
+
+def main():
+    """Start WORKER_PROCESSES workers (default: one, in this process)
+    
+    Extra workers are spawned rather than forked: TensorFlow, pymongo and
+    pika are not fork-safe once initialized, so each child loads its own
+    copy of the (small) model and opens its own connections.
+    """
+    processes = int(os.getenv("WORKER_PROCESSES", 1))
+    if processes <= 1:
+        run_worker()
+        return
+    
+    context = multiprocessing.get_context("spawn")
+    preparer = context.Process(target=prepare_model, name="sentiment-worker-prepare")
+    preparer.start()
+    preparer.join()
+    
+    children = [
+        context.Process(target=run_worker, args=(index, processes), name=f"sentiment-worker-{index}")
+        for index in range(processes)
+    ]
+    for child in children:
+        child.start()
+    logger.info(f"Started {processes} worker processes")
+    
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        # Children get the same SIGINT and drain their own batches
+        for child in children:
+            child.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import logging
+import os
+import redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+class CacheService:
+    """Writes completed results to the API's Redis result cache
+
+    Populating the cache at write time means the first poll for a finished
+    job is served without a MongoDB round-trip. Failures are only logged;
+    MongoDB remains the source of truth.
+    """
+
+    def __init__(self):
+        self.redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
+        self.ttl = int(os.getenv("RESULT_CACHE_TTL", 3600))
+        self.key_prefix = "res:"
+        # from_url keeps a connection pool; connections are opened lazily
+        self.client = redis.Redis.from_url(
+            self.redis_url,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+
+    def set_result(self, job_id: str, payload: bytes):
+        """Cache the JSON response body for a completed job"""
+        try:
+            self.client.set(f"{self.key_prefix}{job_id}", payload, ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"Redis cache write failed for job {job_id}: {str(e)}")
+
+    def close(self):
+        """Release pooled Redis connections"""
+        self.client.close()
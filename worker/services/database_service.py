@@ -1,11 +1,16 @@
 import logging
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, DuplicateKeyError, OperationFailure
+from typing import List, Set, Tuple
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
 
 logger = logging.getLogger(__name__)
 
 class DatabaseService:
+    # One client (and connection pool) per process, shared by all instances
+    # and reused across connection retries
+    _client = None
+    
     def __init__(self):
         self.mongodb_url = os.getenv("MONGODB_URL", "mongodb://mongodb:27017/sentiment_db")
         self.client = None
@@ -20,17 +25,28 @@ class DatabaseService:
         
         for attempt in range(max_retries):
             try:
-                self.client = MongoClient(
-                    self.mongodb_url,
-                    serverSelectionTimeoutMS=5000,
-                    maxPoolSize=50,
-                    retryWrites=True
-                )
+                if DatabaseService._client is None:
+                    # The worker is single-threaded: a small warm pool is enough
+                    DatabaseService._client = MongoClient(
+                        self.mongodb_url,
+                        serverSelectionTimeoutMS=5000,
+                        minPoolSize=1,
+                        maxPoolSize=4,
+                        maxIdleTimeMS=60000,
+                        socketTimeoutMS=5000,
+                        retryWrites=True,
+                        compressors=os.getenv("MONGODB_COMPRESSORS", "zstd,zlib"),
+                        zlibCompressionLevel=3
+                    )
+                self.client = DatabaseService._client
                 # Test connection
                 self.client.admin.command('ping')
                 self.db = self.client.sentiment_db
                 self.collection = self.db.sentiment_results
                 
+                # Upserts and duplicate checks key on job_id
+                self.collection.create_index("job_id", unique=True)
+                
                 logger.info(f"Worker connected to MongoDB (attempt {attempt + 1})")
                 return
                 
@@ -51,22 +67,68 @@ class DatabaseService:
             logger.error(f"Error checking for existing result: {str(e)}")
             return None
     
+    def get_existing_job_ids(self, job_ids: List[str]) -> Set[str]:
+        """Return which of job_ids already have a stored result (one query)"""
+        try:
+            cursor = self.collection.find(
+                {"job_id": {"$in": list(job_ids)}},
+                projection={"_id": 0, "job_id": 1}
+            )
+            return {document["job_id"] for document in cursor}
+        except Exception as e:
+            logger.error(f"Error checking for existing results: {str(e)}")
+            return set()
+    
     def save_result(self, result: dict):
-        """Save sentiment analysis result to MongoDB"""
+        """Save sentiment analysis result to MongoDB
+        
+        An upsert with $setOnInsert lets the server resolve duplicate job IDs
+        against the unique index: the first stored result wins and a
+        redelivered job is a no-op rather than a DuplicateKeyError.
+        """
         try:
-            self.collection.insert_one(result)
-            logger.debug(f"Result saved for job: {result['job_id']}")
-        except DuplicateKeyError:
-            logger.warning(f"Duplicate job_id detected: {result['job_id']}")
-            # Update existing record
-            self.collection.update_one(
+            update = self.collection.update_one(
                 {"job_id": result["job_id"]},
-                {"$set": result}
+                {"$setOnInsert": result},
+                upsert=True
             )
+            if update.upserted_id is None:
+                logger.warning(f"Duplicate job_id detected: {result['job_id']}")
+            else:
+                logger.debug(f"Result saved for job: {result['job_id']}")
         except Exception as e:
             logger.error(f"Error saving result to MongoDB: {str(e)}")
             raise
     
+    def save_results(self, results: List[dict]) -> Tuple[Set[int], Set[int]]:
+        """Save a batch of results with one unordered bulk upsert
+        
+        Like save_result, existing job IDs are left untouched. Returns the
+        indexes (into results) of documents that were inserted and of those
+        that failed to write; the rest matched an already stored job.
+        Connection-level errors are raised for the whole batch.
+        """
+        if not results:
+            return set(), set()
+        
+        operations = [
+            UpdateOne({"job_id": result["job_id"]}, {"$setOnInsert": result}, upsert=True)
+            for result in results
+        ]
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            inserted = set(result.upserted_ids)
+            logger.debug(f"Saved {len(inserted)} of {len(results)} results")
+            return inserted, set()
+        except BulkWriteError as e:
+            inserted = {upsert["index"] for upsert in e.details.get("upserted", [])}
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error(f"Bulk save failed for {len(failed)} of {len(results)} results")
+            return inserted, failed
+        except Exception as e:
+            logger.error(f"Error saving results to MongoDB: {str(e)}")
+            raise
+    
     def check_connection(self):
         """Check if MongoDB is reachable"""
         try: